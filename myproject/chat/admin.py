@@ -1,24 +1,176 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from .caching import bump_version, room_scope
 from .models import ChatRoom, ChatMessage, UserProfile, RoomMember
 
+KEYSET_VAR = 'before'
+COUNT_CAP = 10000
+
+class EstimatedCountPaginator(Paginator):
+    """Не считает COUNT(*) по всей таблице на каждой странице.
+
+    Без фильтров на PostgreSQL берём оценку из pg_class, иначе считаем не
+    дальше COUNT_CAP строк. Более старые записи — по ссылке ?before=<id>.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > COUNT_CAP:
+                return int(row[0])
+        return queryset.order_by()[:COUNT_CAP].count()
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'bio', 'created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
     search_fields = ['user__username']
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
     list_display = ['name', 'created_by', 'created_at', 'is_private']
     list_filter = ['is_private', 'created_at']
+    list_select_related = ['created_by']
+    raw_id_fields = ['created_by']
     search_fields = ['name']
+    actions = ['purge_room', 'export_room']
+
+    # Действия меняют и читают ChatMessage, а не саму комнату, поэтому кроме прав
+    # на ChatRoom нужны права на сообщения
+    def has_purge_permission(self, request):
+        return self.has_delete_permission(request) and request.user.has_perm('chat.delete_chatmessage')
+
+    def has_export_permission(self, request):
+        return self.has_view_permission(request) and request.user.has_perm('chat.view_chatmessage')
+
+    @admin.action(description='Удалить все сообщения (в фоне)', permissions=['purge'])
+    def purge_room(self, request, queryset):
+        # jobs импортируем по месту: админка загружается при старте каждого воркера,
+        # а код фоновых задач нужен только runworker chat-jobs (см. asgi.py)
+        from . import jobs
+
+        for room_id in queryset.values_list('id', flat=True):
+            jobs.enqueue('purge_room', room_id=room_id)
+        self.message_user(request, 'Очистка поставлена в очередь chat-jobs', messages.SUCCESS)
+
+    @admin.action(description='Экспортировать сообщения в CSV (в фоне)', permissions=['export'])
+    def export_room(self, request, queryset):
+        from . import jobs
+
+        started = timezone.now().strftime('%Y%m%d%H%M%S')
+        filenames = []
+        for room_id in queryset.values_list('id', flat=True):
+            jobs.enqueue('export_room', room_id=room_id, started=started)
+            filenames.append(jobs.export_filename(room_id, started))
+        links = format_html_join(', ', '<a href="{}">{}</a>', (
+            (reverse('admin:chat_chatroom_export', args=[filename]), filename)
+            for filename in filenames
+        ))
+        self.message_user(request, format_html(
+            'Экспорт поставлен в очередь chat-jobs. Файлы можно будет скачать, '
+            'когда он завершится: {}', links,
+        ), messages.SUCCESS)
+
+    def get_urls(self):
+        return [
+            path(
+                'exports/<str:filename>/',
+                self.admin_site.admin_view(self.download_export),
+                name='chat_chatroom_export',
+            ),
+        ] + super().get_urls()
+
+    def download_export(self, request, filename):
+        from . import jobs
+
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+        # Только имена, которые создаёт jobs.export_filename: никаких путей из запроса
+        if not jobs.EXPORT_NAME_RE.match(filename):
+            raise Http404
+        export_path = jobs.EXPORT_DIR / filename
+        if not export_path.is_file():
+            raise Http404('Экспорт ещё не завершён или файл удалён')
+        return FileResponse(open(export_path, 'rb'), as_attachment=True, filename=filename)
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ['user', 'room', 'timestamp', 'is_read']
-    list_filter = ['room', 'timestamp']
+    list_filter = ['is_read']
+    list_select_related = ['user', 'room']
+    autocomplete_fields = ['room']
+    raw_id_fields = ['user']
     search_fields = ['message']
+    date_hierarchy = 'timestamp'
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        # ?before=<id> — keyset-страница: WHERE id < before ORDER BY id DESC, без OFFSET.
+        # Только при сортировке по умолчанию (-id): при ?o=... условие id < before
+        # обрезало бы список случайным образом, там остаётся обычная пагинация.
+        # Убираем параметр из GET, иначе ChangeList примет его за фильтр
+        keyset = ORDER_VAR not in request.GET
+        request.keyset_before = None
+        if KEYSET_VAR in request.GET:
+            if keyset:
+                try:
+                    request.keyset_before = int(request.GET[KEYSET_VAR])
+                except ValueError:
+                    pass
+            request.GET = request.GET.copy()
+            del request.GET[KEYSET_VAR]
+
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if keyset and changelist is not None and len(changelist.result_list) >= changelist.list_per_page:
+            last = list(changelist.result_list)[-1]
+            response.context_data['keyset_next'] = changelist.get_query_string(
+                {KEYSET_VAR: last.pk}, remove=['p']
+            )
+        return response
+
+    # У ChatMessage нет receiver'а post_delete (см. signals.py) — версии комнат
+    # после удаления из админки поднимаем сами
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_version(room_scope(obj.room_id))
+
+    def delete_queryset(self, request, queryset):
+        room_ids = set(queryset.values_list('room_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for room_id in room_ids:
+            bump_version(room_scope(room_id))
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        before = getattr(request, 'keyset_before', None)
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        return queryset
 
 @admin.register(RoomMember)
 class RoomMemberAdmin(admin.ModelAdmin):
     list_display = ['user', 'room', 'joined_at', 'is_admin']
-    list_filter = ['room', 'is_admin']
\ No newline at end of file
+    list_filter = ['is_admin']
+    list_select_related = ['user', 'room']
+    autocomplete_fields = ['room']
+    raw_id_fields = ['user']
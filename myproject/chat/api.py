@@ -0,0 +1,169 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import history
+from .caching import ROOM_LIST_SCOPE, bump_version, get_version, is_shared, room_scope
+from .models import ChatMessage, ChatRoom, visible_rooms
+from .serializers import (
+    MessageListSerializer,
+    MessageWriteSerializer,
+    RoomListSerializer,
+    RoomWriteSerializer,
+)
+
+BULK_LIMIT = getattr(settings, 'CHAT_API_BULK_LIMIT', 100)
+
+logger = logging.getLogger(__name__)
+
+
+class IdCursorPagination(CursorPagination):
+    # Курсор по id: для сообщений это диапазон по индексу (room_id, id), без OFFSET
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def broadcast(room_id, chat_messages):
+    """Рассылает сообщения, созданные через API, в сокеты комнаты."""
+    group_send = async_to_sync(get_channel_layer().group_send)
+    try:
+        for chat_message in chat_messages:
+            group_send(f'chat_{room_id}', {
+                'type': 'chat_message',
+                **history.message_payload(chat_message),
+            })
+    except Exception:
+        # Сообщения уже сохранены — клиенты получат их при догрузке по ?since=
+        # (history.missed_messages сверяет буфер с БД)
+        logger.exception('Не удалось разослать сообщения комнаты %s', room_id)
+
+
+class ConditionalMixin:
+    """ETag из версии кэша (см. caching.py): неизменившийся ответ — 304 без сериализации.
+
+    Права на комнату проверяются до сравнения ETag, иначе чужой приватной
+    комнате с угаданным ETag ответили бы 304 вместо 404.
+    """
+
+    def etag(self, scope):
+        # Без общего кэша ETag не отдаём (см. caching.is_shared)
+        if not is_shared():
+            return None
+        return quote_etag(f'{get_version(scope)}-{self.request.user.pk or 0}')
+
+    def not_modified(self, etag):
+        if etag is None:
+            return None
+        return get_conditional_response(self.request, etag=etag)
+
+    def with_etag(self, response, etag):
+        if etag is not None:
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class RoomListView(ConditionalMixin, APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        etag = self.etag(ROOM_LIST_SCOPE)
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+        fields = RoomListSerializer.parse_fields(request)
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(visible_rooms(request.user), request, view=self)
+        data = RoomListSerializer(page, many=True, fields=fields).data
+        return self.with_etag(paginator.get_paginated_response(data), etag)
+
+    def post(self, request):
+        serializer = RoomWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        room = ChatRoom.objects.create(created_by=request.user, **serializer.validated_data)
+        return Response(RoomListSerializer(room).data, status=status.HTTP_201_CREATED)
+
+
+class RoomDetailView(ConditionalMixin, APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, room_id):
+        room = get_object_or_404(visible_rooms(request.user), pk=room_id)
+        etag = self.etag(room_scope(room_id))
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+        fields = RoomListSerializer.parse_fields(request)
+        return self.with_etag(Response(RoomListSerializer(room, fields=fields).data), etag)
+
+
+class MessageListView(ConditionalMixin, APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, room_id):
+        room = get_object_or_404(visible_rooms(request.user), pk=room_id)
+        etag = self.etag(room_scope(room_id))
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+        fields = MessageListSerializer.parse_fields(request)
+        queryset = ChatMessage.objects.filter(room=room)
+        if fields is None or 'username' in fields:
+            queryset = queryset.select_related('user')
+
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        data = MessageListSerializer(page, many=True, fields=fields).data
+        return self.with_etag(paginator.get_paginated_response(data), etag)
+
+    def post(self, request, room_id):
+        room = get_object_or_404(visible_rooms(request.user), pk=room_id)
+        serializer = MessageWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        chat_message = ChatMessage.objects.create(
+            room=room, user=request.user, **serializer.validated_data
+        )
+        broadcast(room.id, [chat_message])
+        return Response(MessageListSerializer(chat_message).data, status=status.HTTP_201_CREATED)
+
+
+class MessageBulkView(APIView):
+    """Пакетная отправка сообщений для ботов и интеграций: один INSERT на пачку."""
+
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def post(self, request, room_id):
+        room = get_object_or_404(visible_rooms(request.user), pk=room_id)
+        if not isinstance(request.data, list) or not 0 < len(request.data) <= BULK_LIMIT:
+            return Response(
+                {'detail': f'Ожидается список от 1 до {BULK_LIMIT} сообщений'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = MessageWriteSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        chat_messages = ChatMessage.objects.bulk_create([
+            ChatMessage(room=room, user=request.user, **item)
+            for item in serializer.validated_data
+        ])
+        # bulk_create не шлёт post_save — версию кэша комнаты поднимаем сами
+        bump_version(room_scope(room.id))
+        broadcast(room.id, chat_messages)
+
+        data = MessageListSerializer(chat_messages, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
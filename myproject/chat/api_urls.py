@@ -0,0 +1,9 @@
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('rooms/', api.RoomListView.as_view(), name='api_rooms'),
+    path('rooms/<int:room_id>/', api.RoomDetailView.as_view(), name='api_room_detail'),
+    path('rooms/<int:room_id>/messages/', api.MessageListView.as_view(), name='api_messages'),
+    path('rooms/<int:room_id>/messages/bulk/', api.MessageBulkView.as_view(), name='api_messages_bulk'),
+]
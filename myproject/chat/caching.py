@@ -0,0 +1,125 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ChatMessage, ChatRoom, RoomMember
+
+ROOM_LIST_SCOPE = 'rooms'
+# Срок жизни ключей данных: данные под старыми версиями никто не читает,
+# они должны истекать, а не копиться в Redis
+CACHE_TTL = getattr(settings, 'CHAT_PAGE_CACHE_TTL', 60 * 60)
+
+
+def is_shared():
+    """Кэш общий для всех процессов (Redis).
+
+    Сообщения сохраняет ASGI-процесс, а страницы отдают HTTP-воркеры. С локальным
+    кэшем каждого процесса версии в них не поднимаются, и ETag или кэш данных
+    отдавали бы устаревшую страницу — тогда не пользуемся ни тем, ни другим.
+    """
+    return getattr(settings, 'CHAT_SHARED_CACHE', False)
+
+
+def room_scope(room_id):
+    return f'room:{room_id}'
+
+
+def _version_key(scope):
+    return f'chat:version:{scope}'
+
+
+def get_version(scope):
+    """Текущая версия области кэша.
+
+    Ключи данных содержат версию, поэтому инвалидация — это просто увеличение
+    версии (см. signals.py). Сами ключи версий бессрочные — их по одному на
+    комнату, а данные под устаревшими версиями истекают через CACHE_TTL.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Начинаем с метки времени: если ключ версии вытеснили из кэша,
+        # старые данные под прежними версиями не оживут
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        get_version(scope)
+
+
+def _count(model):
+    # Коррелированный подзапрос по индексу room_id: не зависит от JOIN'ов
+    # внешнего запроса и не перемножает участников с сообщениями
+    counts = (
+        model.objects.filter(room=OuterRef('pk')).order_by()
+        .values('room').annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _with_counts(queryset, messages=False):
+    counts = {'participants_count': _count(RoomMember)}
+    if messages:
+        counts['messages_count'] = _count(ChatMessage)
+    return queryset.annotate(**counts).values('id', 'name', 'description', *counts)
+
+
+def _public_rooms():
+    return list(_with_counts(ChatRoom.objects.filter(is_private=False)))
+
+
+def _private_rooms(user):
+    memberships = RoomMember.objects.filter(user=user).values('room_id')
+    return list(_with_counts(ChatRoom.objects.filter(
+        Q(id__in=memberships) | Q(created_by=user), is_private=True,
+    )))
+
+
+def _room_header(room_id):
+    return _with_counts(ChatRoom.objects.filter(pk=room_id), messages=True).first()
+
+
+def room_list(user):
+    """Список комнат для главной: общий для всех сегмент + приватные комнаты пользователя.
+
+    Без счётчика сообщений: иначе каждое сообщение в любой комнате сбрасывало бы
+    кэш списка и ETag главной у всех пользователей.
+    """
+    if not is_shared():
+        return _private_rooms(user) + _public_rooms()
+    version = get_version(ROOM_LIST_SCOPE)
+
+    public_key = f'chat:room_list:public:{version}'
+    rooms = cache.get(public_key)
+    if rooms is None:
+        rooms = _public_rooms()
+        cache.set(public_key, rooms, timeout=CACHE_TTL)
+
+    private_key = f'chat:room_list:private:{user.pk}:{version}'
+    private_rooms = cache.get(private_key)
+    if private_rooms is None:
+        private_rooms = _private_rooms(user)
+        cache.set(private_key, private_rooms, timeout=CACHE_TTL)
+
+    return private_rooms + rooms
+
+
+def room_header(room_id):
+    """Шапка комнаты (название и счётчики) или None, если комнаты нет."""
+    if not is_shared():
+        return _room_header(room_id)
+    key = f'chat:room_header:{room_id}:{get_version(room_scope(room_id))}'
+    header = cache.get(key)
+    if header is None:
+        header = _room_header(room_id)
+        if header is not None:
+            cache.set(key, header, timeout=CACHE_TTL)
+    return header
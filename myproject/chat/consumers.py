@@ -1,54 +1,135 @@
 import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
 from django.utils import timezone
-from .models import ChatRoom, ChatMessage, User
+from . import drain, ephemeral, history, outbound
+from .models import MAX_MESSAGE_LENGTH, ChatRoom, ChatMessage, User, visible_rooms
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
+        self.subscribed = False
+        self.outbound = None
+
+        if drain.is_draining():
+            # Процесс готовится к остановке — новые сокеты не принимаем
+            await self.close()
+            return
 
-        # Присоединяемся к группе комнаты
+        # Присоединяемся к группе комнаты до догрузки, чтобы не потерять
+        # сообщения, пришедшие во время неё (дубликаты клиент отбрасывает по id)
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_add(drain.process_group(), self.channel_name)
+        await sync_to_async(history.subscribe)(self.room_id)
+        self.subscribed = True
+        drain.register(self)
 
         await self.accept()
 
+        since = self.get_since()
+        if since is not None:
+            await self.send_missed(since)
+
+        # Дальше живые кадры идут через ограниченную очередь сокета
+        self.outbound = outbound.OutboundQueue(self.send)
+
+    def get_since(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(query['since'][0])
+        except (KeyError, ValueError):
+            return None
+
+    async def send_missed(self, since):
+        # История приватной комнаты — только тем, кто может её читать
+        user = self.scope.get('user') or AnonymousUser()
+        if not await visible_rooms(user).filter(pk=self.room_id).aexists():
+            await self.send(text_data=json.dumps({
+                'error': 'Нет доступа к истории комнаты'
+            }))
+            return
+        missed, has_gap = await sync_to_async(history.missed_messages)(self.room_id, since)
+        if has_gap:
+            # Пропущено слишком много — пусть клиент догрузит историю постранично
+            await self.send(text_data=json.dumps({
+                'type': 'history_gap',
+                'since': since,
+            }))
+            return
+        for payload in missed:
+            await self.send(text_data=json.dumps(payload))
+        await self.send(text_data=json.dumps({
+            'type': 'catchup_done',
+            'since': since,
+            'count': len(missed),
+        }))
+
     async def disconnect(self, close_code):
         # Покидаем группу комнаты
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_discard(drain.process_group(), self.channel_name)
+        drain.unregister(self)
+        self.close_outbound()
+        if self.subscribed:
+            self.subscribed = False
+            history.unsubscribe(self.room_id)
+
+    def get_identity(self, data):
+        # Аутентифицированный сокет (билет или сессия) важнее полей от клиента
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            return user.pk, user.username
+        return data.get('user_id'), data.get('username')
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
+        user_id, username = self.get_identity(text_data_json)
+
+        if text_data_json.get('type') in ephemeral.EVENT_TYPES:
+            # Набор текста и присутствие — мимо БД, склеиваются по тикам
+            event = text_data_json['type']
+            ephemeral.publish(self.room_group_name, {
+                'event': event,
+                'user_id': user_id if isinstance(user_id, int) else None,
+                'username': ephemeral.clean_username(username),
+                'data': ephemeral.clean_data(event, text_data_json.get('data')),
+            })
+            return
+
         message = text_data_json['message']
-        username = text_data_json['username']
-        user_id = text_data_json['user_id']
+        if len(message) > MAX_MESSAGE_LENGTH:
+            await self.send(text_data=json.dumps({
+                'error': f'Сообщение длиннее {MAX_MESSAGE_LENGTH} символов'
+            }))
+            return
 
         # Сохраняем сообщение в базу данных
         try:
             room = await ChatRoom.objects.aget(id=self.room_id)
             user = await User.objects.aget(id=user_id)
-            
+
             chat_message = await ChatMessage.objects.acreate(
                 room=room,
                 user=user,
                 message=message
             )
-            
+
             # Отправляем сообщение в группу
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'chat_message',
-                    'message': message,
-                    'username': username,
-                    'user_id': user_id,
-                    'timestamp': str(chat_message.timestamp),
+                    **history.message_payload(chat_message, username),
                 }
             )
         except Exception as e:
@@ -58,10 +139,54 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }))
 
     async def chat_message(self, event):
-        # Отправляем сообщение WebSocket
-        await self.send(text_data=json.dumps({
+        payload = {
+            'id': event['id'],
             'message': event['message'],
             'username': event['username'],
             'user_id': event['user_id'],
             'timestamp': event['timestamp'],
-        }))
\ No newline at end of file
+        }
+        buffer = history.get_buffer(self.room_id)
+        if buffer is not None:
+            buffer.add(payload)
+
+        if self.outbound is None:
+            return
+        # Отправляем сообщение WebSocket (через очередь, не дожидаясь клиента)
+        if not self.outbound.put_message(payload['id'], json.dumps(payload)):
+            await self.resume_later()
+
+    async def resume_later(self):
+        # Клиент слишком отстал: закрываем сокет с подсказкой, откуда продолжить,
+        # он переподключится с ?since=<id> и догрузит пропущенное
+        since = self.outbound.resume_since
+        self.outbound.overflowed()
+        self.outbound = None
+        await self.close(code=outbound.RESUME_CLOSE_CODE, reason=f'resume:{since}')
+
+    def close_outbound(self):
+        if self.outbound is not None:
+            self.outbound.close()
+            self.outbound = None
+
+    async def ephemeral_batch(self, event):
+        if self.outbound is None or ephemeral.is_stale(event):
+            return
+        self.outbound.put_ephemeral(json.dumps({
+            'type': 'ephemeral',
+            'events': event['events'],
+        }))
+
+    async def drain_start(self, event):
+        drain.set_draining(event.get('window_ms'))
+        if self.outbound is not None:
+            # Новые кадры больше не принимаем, но уже поставленные дописываем
+            queue, self.outbound = self.outbound, None
+            await queue.flush(drain.FLUSH_TIMEOUT_MS / 1000)
+        # Сообщаем клиенту, через сколько переподключаться (к другому воркеру),
+        # и закрываем сокет с кодом 1012 (Service Restart)
+        await self.send(text_data=json.dumps({
+            'type': 'reconnect',
+            'delay_ms': drain.reconnect_delay(event.get('window_ms')),
+        }))
+        await self.close(code=1012)
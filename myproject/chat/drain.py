@@ -0,0 +1,112 @@
+import asyncio
+import os
+import random
+import re
+import signal
+import socket
+import time
+import weakref
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+DRAIN_WINDOW_MS = getattr(settings, 'CHAT_DRAIN_WINDOW_MS', 10000)
+DRAIN_SIGNAL = getattr(settings, 'CHAT_DRAIN_SIGNAL', 'SIGUSR1')
+UNDRAIN_SIGNAL = getattr(settings, 'CHAT_UNDRAIN_SIGNAL', 'SIGUSR2')
+# Сколько процесс после окна переподключения ещё отказывает новым сокетам.
+# Если его так и не перезапустили (деплой отменён), он снова начинает их принимать
+DRAIN_HOLD_MS = getattr(settings, 'CHAT_DRAIN_HOLD_MS', 60000)
+FLUSH_TIMEOUT_MS = getattr(settings, 'CHAT_DRAIN_FLUSH_TIMEOUT_MS', 2000)
+
+_draining_until = 0
+_loop = None
+_consumers = weakref.WeakSet()
+
+
+def drain_group(host, pid):
+    """Группа сокетов одного процесса: drain касается только его, а не всех воркеров."""
+    host = re.sub(r'[^a-zA-Z0-9\-.]', '-', host)[:60]
+    return f'chat_drain.{host}.{pid}'
+
+
+def process_group():
+    # pid берём при каждом вызове: код мог быть импортирован до fork воркера
+    return drain_group(socket.gethostname(), os.getpid())
+
+
+def is_draining():
+    return time.monotonic() < _draining_until
+
+
+def set_draining(window_ms=None):
+    global _draining_until
+    if window_ms is None:
+        window_ms = DRAIN_WINDOW_MS
+    _draining_until = max(
+        _draining_until,
+        time.monotonic() + (max(int(window_ms), 0) + DRAIN_HOLD_MS) / 1000,
+    )
+
+
+def stop_draining():
+    global _draining_until
+    _draining_until = 0
+
+
+def register(consumer):
+    global _loop
+    _consumers.add(consumer)
+    # Цикл событий нужен обработчику сигнала, чтобы разослать drain_start
+    _loop = asyncio.get_running_loop()
+
+
+def unregister(consumer):
+    _consumers.discard(consumer)
+
+
+def reconnect_delay(window_ms=None):
+    """Случайная задержка переподключения, чтобы клиенты не вернулись разом."""
+    if window_ms is None:
+        window_ms = DRAIN_WINDOW_MS
+    return random.randint(0, max(int(window_ms), 0))
+
+
+async def drain_process(window_ms=None):
+    """Переводит процесс в режим drain и закрывает все его сокеты."""
+    set_draining(window_ms)
+    channel_layer = get_channel_layer()
+    # Событие идёт через очередь каждого consumer'а: он обработает его
+    # только после уже начатых receive, так что их записи успеют завершиться
+    for consumer in list(_consumers):
+        await channel_layer.send(consumer.channel_name, {
+            'type': 'drain_start',
+            'window_ms': window_ms,
+        })
+
+
+def _on_drain_signal(signum, frame):
+    if _loop is None or _loop.is_closed():
+        # Сокетов ещё не было — закрывать нечего, просто не принимаем новые
+        set_draining()
+        return
+    _loop.call_soon_threadsafe(lambda: _loop.create_task(drain_process()))
+
+
+def _on_undrain_signal(signum, frame):
+    stop_draining()
+
+
+def install_signal_handlers():
+    """Ставит обработчики сигналов drain при старте процесса (см. asgi.py).
+
+    До первого сокета SIGUSR1 иначе завершил бы процесс действием по умолчанию.
+    """
+    for name, handler in ((DRAIN_SIGNAL, _on_drain_signal), (UNDRAIN_SIGNAL, _on_undrain_signal)):
+        if not name:
+            continue
+        try:
+            signal.signal(getattr(signal, name), handler)
+        except (AttributeError, ValueError):
+            # Сигнал недоступен (Windows) или модуль импортирован не в главном
+            # потоке — остаётся команда manage.py drain_chat
+            pass
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+# Эфемерные события не сохраняются в БД и могут теряться
+EVENT_TYPES = {'typing', 'presence'}
+TICK_MS = getattr(settings, 'CHAT_EPHEMERAL_TICK_MS', 100)
+MAX_LAG_MS = getattr(settings, 'CHAT_EPHEMERAL_MAX_LAG_MS', 1000)
+MAX_DATA_LENGTH = getattr(settings, 'CHAT_EPHEMERAL_MAX_DATA_LENGTH', 32)
+MAX_USERNAME_LENGTH = 150  # как User.username
+
+
+class Coalescer:
+    """Склеивает эфемерные события в пределах одного тика.
+
+    На каждого пользователя и тип события в комнате остаётся только последнее
+    значение (last-write-wins), и раз в тик в группу комнаты уходит одно
+    сообщение ephemeral_batch вместо отдельного group_send на каждое событие.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.task = None
+
+    def publish(self, group, payload):
+        self.pending.setdefault(group, {})[(payload['user_id'], payload['event'])] = payload
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(TICK_MS / 1000)
+        pending, self.pending = self.pending, {}
+        self.task = None
+        channel_layer = get_channel_layer()
+        for group, events in pending.items():
+            try:
+                await channel_layer.group_send(group, {
+                    'type': 'ephemeral_batch',
+                    'events': list(events.values()),
+                    'sent_at': time.time(),
+                })
+            except Exception:
+                # Потеря эфемерного события допустима, следующий тик пришлёт новое
+                pass
+
+
+_coalescer = None
+
+
+def clean_data(event, data):
+    """Значение data, которое можно разослать комнате, или None.
+
+    Пачка уходит каждому сокету комнаты, поэтому от клиента принимаем только
+    флаг набора текста и короткую строку статуса присутствия.
+    """
+    if event == 'typing':
+        return bool(data)
+    if isinstance(data, str) and len(data) <= MAX_DATA_LENGTH:
+        return data
+    return None
+
+
+def clean_username(username):
+    if not isinstance(username, str):
+        return None
+    return username[:MAX_USERNAME_LENGTH]
+
+
+def publish(group, payload):
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = Coalescer()
+    _coalescer.publish(group, payload)
+
+
+def is_stale(event):
+    """Пачка пришла с опозданием — очередь подписчика забита, её лучше выбросить."""
+    return (time.time() - event['sent_at']) * 1000 > MAX_LAG_MS
@@ -0,0 +1,131 @@
+import bisect
+from collections import deque
+
+from django.conf import settings
+
+from .models import ChatMessage
+
+RECENT_BUFFER_SIZE = getattr(settings, 'CHAT_RECENT_BUFFER_SIZE', 200)
+CATCHUP_LIMIT = getattr(settings, 'CHAT_CATCHUP_LIMIT', 500)
+
+
+def message_payload(chat_message, username=None):
+    # Единый формат сообщения для WebSocket: и для живой доставки, и для догрузки
+    return {
+        'id': chat_message.id,
+        'message': chat_message.message,
+        'username': username if username is not None else chat_message.user.username,
+        'user_id': chat_message.user_id,
+        'timestamp': str(chat_message.timestamp),
+    }
+
+
+class RecentBuffer:
+    """Последние сообщения комнаты в памяти процесса.
+
+    Буфер гарантированно содержит все сообщения комнаты с id > covered_from,
+    пока в этом процессе есть хотя бы один подписчик группы комнаты.
+    """
+
+    def __init__(self, covered_from, payloads=(), maxlen=RECENT_BUFFER_SIZE):
+        self.covered_from = covered_from
+        self.ids = deque(maxlen=maxlen)
+        self.payloads = deque(maxlen=maxlen)
+        self.subscribers = 0
+        for payload in payloads:
+            self.add(payload)
+
+    def add(self, payload):
+        message_id = payload['id']
+        if message_id <= self.covered_from:
+            return
+        index = bisect.bisect_left(self.ids, message_id)
+        # Каждый подписчик процесса получает сообщение группы, сохраняем один раз
+        if index < len(self.ids) and self.ids[index] == message_id:
+            return
+        if len(self.ids) == self.ids.maxlen:
+            # Вытесняем самое старое сообщение, покрытие сдвигается вместе с ним
+            self.covered_from = self.ids.popleft()
+            self.payloads.popleft()
+            index -= 1
+        if message_id <= self.covered_from:
+            return
+        self.ids.insert(index, message_id)
+        self.payloads.insert(index, payload)
+
+    def since(self, message_id):
+        """Сообщения с id > message_id или None, если буфер их не покрывает."""
+        if message_id < self.covered_from:
+            return None
+        index = bisect.bisect_right(self.ids, message_id)
+        return [self.payloads[i] for i in range(index, len(self.ids))]
+
+
+_recent = {}
+
+
+def get_buffer(room_id):
+    return _recent.get(room_id)
+
+
+def subscribe(room_id):
+    """Регистрирует подписчика; при первом подписчике буфер заполняется из БД."""
+    buffer = _recent.get(room_id)
+    if buffer is None:
+        latest = list(
+            ChatMessage.objects.filter(room_id=room_id)
+            .select_related('user')
+            .order_by('-id')[:RECENT_BUFFER_SIZE]
+        )
+        latest.reverse()
+        if len(latest) < RECENT_BUFFER_SIZE:
+            # В буфере вся история комнаты
+            covered_from = 0
+        else:
+            covered_from = latest[0].id
+            latest = latest[1:]
+        buffer = _recent.setdefault(
+            room_id, RecentBuffer(covered_from, [message_payload(m) for m in latest])
+        )
+    buffer.subscribers += 1
+    return buffer
+
+
+def unsubscribe(room_id):
+    buffer = _recent.get(room_id)
+    if buffer is None:
+        return
+    buffer.subscribers -= 1
+    if buffer.subscribers <= 0:
+        # Без подписчиков процесс перестаёт видеть сообщения комнаты — буфер устаревает
+        del _recent[room_id]
+
+
+def missed_messages(room_id, since_id):
+    """Возвращает (сообщения, has_gap) для догрузки после переподключения.
+
+    Сначала пробуем буфер в памяти, затем диапазонный запрос по индексу
+    (room_id, id). Если пропущено больше CATCHUP_LIMIT сообщений, возвращаем
+    has_gap=True: клиент должен догружать историю постранично.
+    """
+    buffer = _recent.get(room_id)
+    if buffer is not None:
+        payloads = buffer.since(since_id)
+        if payloads is not None:
+            if len(payloads) > CATCHUP_LIMIT:
+                return [], True
+            # Буфер пополняется при доставке, а не при сохранении: сообщение может
+            # ещё ждать в очереди consumer'а или рассылка могла не дойти.
+            # Одна проверка по индексу — нет ли в БД чего-то новее буфера
+            last_id = payloads[-1]['id'] if payloads else since_id
+            if not ChatMessage.objects.filter(room_id=room_id, id__gt=last_id).exists():
+                return payloads, False
+
+    missed = list(
+        ChatMessage.objects.filter(room_id=room_id, id__gt=since_id)
+        .select_related('user')
+        .order_by('id')[:CATCHUP_LIMIT + 1]
+    )
+    if len(missed) > CATCHUP_LIMIT:
+        return [], True
+    return [message_payload(m) for m in missed], False
@@ -0,0 +1,86 @@
+import csv
+import re
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from channels.consumer import SyncConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections
+
+from .caching import bump_version, room_scope
+from .models import ChatMessage
+
+# Фоновые задачи админки: manage.py runworker chat-jobs
+JOBS_CHANNEL = 'chat-jobs'
+CHUNK_SIZE = getattr(settings, 'CHAT_JOBS_CHUNK_SIZE', 1000)
+EXPORT_DIR = Path(getattr(settings, 'CHAT_EXPORT_DIR', settings.BASE_DIR / 'exports'))
+EXPORT_NAME_RE = re.compile(r'^room_\d+_\d+\.csv$')
+
+
+def export_filename(room_id, started):
+    # Имя файла проверяет и представление скачивания в админке (EXPORT_NAME_RE)
+    return f'room_{room_id}_{started}.csv'
+
+
+def enqueue(job_type, **params):
+    async_to_sync(get_channel_layer().send)(JOBS_CHANNEL, {'type': job_type, **params})
+
+
+class JobConsumer(SyncConsumer):
+    """Обрабатывает задачи по одной пачке за сообщение.
+
+    После каждой пачки задача ставит себя в очередь снова, поэтому длинная
+    очистка не занимает воркер целиком и не держит долгую транзакцию.
+    """
+
+    def purge_room(self, event):
+        room_id = event['room_id']
+        ids = list(
+            ChatMessage.objects.filter(room_id=room_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:CHUNK_SIZE]
+        )
+        if ids:
+            # Без post_delete на каждое сообщение: версии кэша поднимаем один раз на пачку.
+            # Пачка — это первые id комнаты, поэтому удаляем диапазоном по индексу
+            # (room_id, id); на ChatMessage никто не ссылается, каскад не нужен
+            connection = connections[ChatMessage.objects.db]
+            table = connection.ops.quote_name(ChatMessage._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE room_id = %s AND id <= %s',
+                    [room_id, ids[-1]],
+                )
+        bump_version(room_scope(room_id))
+        if len(ids) == CHUNK_SIZE:
+            enqueue('purge_room', room_id=room_id)
+
+    def export_room(self, event):
+        room_id = event['room_id']
+        after_id = event.get('after_id', 0)
+        path = EXPORT_DIR / export_filename(room_id, event['started'])
+        # Пока экспорт идёт, файл лежит с суффиксом .part и не отдаётся на скачивание
+        part_path = path.with_name(path.name + '.part')
+
+        chunk = list(
+            ChatMessage.objects.filter(room_id=room_id, id__gt=after_id)
+            .select_related('user')
+            .order_by('id')[:CHUNK_SIZE]
+        )
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(part_path, 'a', newline='', encoding='utf-8') as export_file:
+            writer = csv.writer(export_file)
+            if not after_id:
+                writer.writerow(['id', 'timestamp', 'user', 'message'])
+            for chat_message in chunk:
+                writer.writerow([
+                    chat_message.id,
+                    chat_message.timestamp.isoformat(),
+                    chat_message.user.username,
+                    chat_message.message,
+                ])
+        if len(chunk) == CHUNK_SIZE:
+            enqueue('export_room', room_id=room_id, after_id=chunk[-1].id, started=event['started'])
+        else:
+            part_path.replace(path)
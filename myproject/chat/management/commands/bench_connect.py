@@ -0,0 +1,104 @@
+import asyncio
+import time
+from importlib import import_module
+
+from asgiref.sync import async_to_sync
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from chat.models import ChatRoom
+from chat.routing import websocket_urlpatterns
+from chat.ws_auth import TicketAuthMiddleware, issue_ticket
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+STRATEGIES = {
+    'session': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'ticket': None,
+}
+
+
+class Command(BaseCommand):
+    help = 'Скорость подключения сокетов (сокетов/с) при разных способах аутентификации'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=500)
+        parser.add_argument('--users', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Отдельная тестовая БД: бенчмарк создаёт пользователей и сессии
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+                users = [
+                    User.objects.create_user(username=f'bench{i}', password='bench')
+                    for i in range(options['users'])
+                ]
+                room = ChatRoom.objects.create(name='bench', created_by=users[0])
+                for name, engine in STRATEGIES.items():
+                    with override_settings(SESSION_ENGINE=engine or settings.SESSION_ENGINE):
+                        self.run_strategy(name, engine, users, room, options['sockets'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_strategy(self, name, engine, users, room, count):
+        router = URLRouter(websocket_urlpatterns)
+        path = f'/ws/chat/{room.id}/'
+        if engine is None:
+            application = TicketAuthMiddleware(router)
+            credentials = [(b'ticket=' + issue_ticket(user).encode(), []) for user in users]
+        else:
+            application = AuthMiddlewareStack(router)
+            credentials = [(b'', [(b'cookie', self.session_cookie(engine, user))]) for user in users]
+
+        async def connect(query_string, headers):
+            inbox, outbox = asyncio.Queue(), asyncio.Queue()
+            scope = {
+                'type': 'websocket', 'path': path, 'query_string': query_string,
+                'headers': headers, 'subprotocols': [],
+            }
+            task = asyncio.create_task(application(scope, inbox.get, outbox.put))
+            await inbox.put({'type': 'websocket.connect'})
+            message = await outbox.get()
+            return message['type'] == 'websocket.accept', inbox, task
+
+        async def close(inbox, task):
+            await inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+            await task
+
+        async def run():
+            # Один сокет держит буфер комнаты, чтобы мерить только аутентификацию
+            _, anchor_inbox, anchor_task = await connect(*credentials[0])
+            start = time.perf_counter()
+            for i in range(count):
+                accepted, inbox, task = await connect(*credentials[i % len(credentials)])
+                if not accepted:
+                    raise RuntimeError('Сокет не принят')
+                await close(inbox, task)
+            elapsed = time.perf_counter() - start
+            await close(anchor_inbox, anchor_task)
+            return elapsed
+
+        # async_to_sync: sync-код consumers выполняется в этом потоке, и его
+        # запросы видны CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            elapsed = async_to_sync(run)()
+        self.stdout.write(
+            f'{name}: {count / elapsed:,.0f} сокетов/с, '
+            f'{len(queries) / count:.2f} запросов к БД на подключение'
+        )
+
+    def session_cookie(self, engine, user):
+        session = import_module(engine).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'.encode()
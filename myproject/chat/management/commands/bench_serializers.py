@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework import serializers
+
+from chat.models import ChatMessage
+from chat.serializers import MessageListSerializer
+
+
+class MessageModelSerializer(serializers.ModelSerializer):
+    # Для сравнения: то, как было в old_main (fields='__all__') + имя автора
+    username = serializers.CharField(source='user.username')
+
+    class Meta:
+        model = ChatMessage
+        fields = '__all__'
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность ModelSerializer и MessageListSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Объекты в памяти — меряем только сериализацию, без БД
+        user = User(id=1, username='bench')
+        now = timezone.now()
+        chat_messages = [
+            ChatMessage(id=i, room_id=1, user=user, message=f'Сообщение {i}', timestamp=now)
+            for i in range(options['count'])
+        ]
+
+        cases = [
+            ('ModelSerializer', lambda: MessageModelSerializer(chat_messages, many=True).data),
+            ('MessageListSerializer', lambda: MessageListSerializer(chat_messages, many=True).data),
+            ('MessageListSerializer ?fields=id,message', lambda: MessageListSerializer(
+                chat_messages, many=True, fields=['id', 'message']).data),
+        ]
+        for name, serialize in cases:
+            best = min(self.timed(serialize) for _ in range(options['runs']))
+            self.stdout.write(f'{name}: {options["count"] / best:,.0f} объектов/с')
+
+    def timed(self, serialize):
+        start = time.perf_counter()
+        serialize()
+        return time.perf_counter() - start
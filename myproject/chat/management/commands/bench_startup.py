@@ -0,0 +1,68 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Выполняется в отдельном «холодном» интерпретаторе: импорт ASGI-приложения
+# и первое WebSocket-подключение через него
+PROBE = '''
+import asyncio, json, time
+start = time.perf_counter()
+from myproject.asgi import application
+imported = time.perf_counter()
+
+from django.conf import settings
+settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+async def first_socket():
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    scope = {
+        'type': 'websocket', 'path': '/ws/chat/%(room_id)s/', 'query_string': b'',
+        'headers': [], 'subprotocols': [],
+    }
+    task = asyncio.create_task(application(scope, inbox.get, outbox.put))
+    await inbox.put({'type': 'websocket.connect'})
+    message = await outbox.get()
+    accepted = time.perf_counter()
+    await inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+    await task
+    return message['type'] == 'websocket.accept', accepted
+
+connected, accepted = asyncio.run(first_socket())
+print(json.dumps({
+    'connected': connected,
+    'import_ms': (imported - start) * 1000,
+    'first_socket_ms': (accepted - start) * 1000,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время от холодного импорта ASGI-приложения до первого принятого сокета'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--room', type=int, default=1, help='id комнаты для подключения')
+
+    def handle(self, *args, **options):
+        results = []
+        for _ in range(options['runs']):
+            output = subprocess.run(
+                [sys.executable, '-c', PROBE % {'room_id': options['room']}],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            if not result['connected']:
+                self.stderr.write('Сокет не принят')
+                return
+            results.append(result)
+
+        for key in ('import_ms', 'first_socket_ms'):
+            values = [r[key] for r in results]
+            self.stdout.write(
+                f'{key}: median {statistics.median(values):.1f}, '
+                f'min {min(values):.1f}, max {max(values):.1f}'
+            )
@@ -0,0 +1,36 @@
+import socket
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from chat.drain import DRAIN_WINDOW_MS, drain_group
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит в режим drain один процесс с ChatConsumer перед его перезапуском. '
+        'Отменить drain без перезапуска: kill -USR2 <pid> (или он истечёт сам, '
+        'см. CHAT_DRAIN_HOLD_MS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pid', type=int, required=True, help='pid процесса-воркера')
+        parser.add_argument(
+            '--host', default=socket.gethostname(),
+            help='Хост воркера (по умолчанию — текущий)',
+        )
+        parser.add_argument(
+            '--window', type=int, default=DRAIN_WINDOW_MS,
+            help='Окно (мс), по которому разбрасываются переподключения клиентов',
+        )
+
+    def handle(self, *args, **options):
+        group = drain_group(options['host'], options['pid'])
+        async_to_sync(get_channel_layer().group_send)(group, {
+            'type': 'drain_start',
+            'window_ms': options['window'],
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f"Drain запущен для {group}, окно переподключения {options['window']} мс"
+        ))
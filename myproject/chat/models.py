@@ -1,28 +1,67 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
+MAX_MESSAGE_LENGTH = getattr(settings, 'CHAT_MAX_MESSAGE_LENGTH', 4000)
+
+class UserProfile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    bio = models.TextField(max_length=500, blank=True)
+    birth_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.user.username
+
 class ChatRoom(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_rooms')
     created_at = models.DateTimeField(auto_now_add=True)
-    
+    is_private = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-created_at']
+
     def __str__(self):
         return self.name
 
 class RoomMember(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_memberships')
     joined_at = models.DateTimeField(auto_now_add=True)
-    
+    is_admin = models.BooleanField(default=False)
+
     class Meta:
-        unique_together = ['user', 'room']
+        unique_together = ['room', 'user']
+
+    def __str__(self):
+        return f"{self.user.username} in {self.room.name}"
 
 class ChatMessage(models.Model):
-    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages')
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
-    
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['timestamp']
+        indexes = [
+            # Догрузка пропущенных сообщений: WHERE room_id = ? AND id > ? ORDER BY id
+            models.Index(fields=['room', 'id'], name='chat_msg_room_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}: {self.message[:50]}"
+
+def visible_rooms(user):
+    """Комнаты, которые пользователь может читать: открытые, свои и те, где он участник."""
+    if not user.is_authenticated:
+        return ChatRoom.objects.filter(is_private=False)
+    # id__in вместо JOIN по members: без DISTINCT и без влияния на агрегаты
+    return ChatRoom.objects.filter(
+        models.Q(is_private=False)
+        | models.Q(created_by=user)
+        | models.Q(id__in=RoomMember.objects.filter(user=user).values('room_id'))
+    )
@@ -0,0 +1,121 @@
+import asyncio
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+MAX_MESSAGES = getattr(settings, 'CHAT_OUTBOUND_MAX_MESSAGES', 100)
+MAX_CHARS = getattr(settings, 'CHAT_OUTBOUND_MAX_CHARS', 1024 * 1024)
+MAX_EPHEMERAL = getattr(settings, 'CHAT_OUTBOUND_MAX_EPHEMERAL', 10)
+
+# Код закрытия, после которого клиент переподключается с ?since=<id из reason>
+RESUME_CLOSE_CODE = 4008
+
+_queues = weakref.WeakSet()
+_totals = {'dropped_ephemeral': 0, 'overflow_disconnects': 0}
+
+
+class OutboundQueue:
+    """Ограниченная очередь исходящих кадров одного сокета.
+
+    Обработчики consumer'а только кладут кадры в очередь и сразу возвращаются,
+    отправкой занимается отдельная задача. Медленный клиент копит очередь
+    только у себя: остальные подписчики комнаты его не ждут, а память на
+    соединение ограничена MAX_MESSAGES / MAX_CHARS.
+
+    Политики переполнения:
+      - эфемерные кадры — выбрасывается самый старый (не больше MAX_EPHEMERAL),
+        а кадр, с которым очередь превысила бы MAX_CHARS, не ставится вовсе;
+      - сообщения чата — put_message возвращает False, consumer закрывает
+        сокет с подсказкой, с какого id продолжить (resume_since).
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.messages = deque()
+        self.ephemeral = deque(maxlen=MAX_EPHEMERAL)
+        self.queued_chars = 0
+        self.resume_since = None
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        _queues.add(self)
+
+    def __len__(self):
+        return len(self.messages) + len(self.ephemeral)
+
+    def put_message(self, message_id, text):
+        if self.resume_since is None:
+            # id не сплошные, но since означает «id больше», поэтому id - 1 достаточно
+            self.resume_since = message_id - 1
+        # В пустую очередь кадр принимается всегда, даже больше MAX_CHARS,
+        # иначе одно большое сообщение закрывало бы все сокеты комнаты
+        if self.messages and (
+            len(self.messages) >= MAX_MESSAGES or self.queued_chars + len(text) > MAX_CHARS
+        ):
+            return False
+        self.messages.append((message_id, text))
+        self.queued_chars += len(text)
+        self.idle.clear()
+        self.wakeup.set()
+        return True
+
+    def put_ephemeral(self, text):
+        if len(self.ephemeral) == self.ephemeral.maxlen:
+            self.queued_chars -= len(self.ephemeral.popleft())
+            _totals['dropped_ephemeral'] += 1
+        if self.queued_chars + len(text) > MAX_CHARS:
+            _totals['dropped_ephemeral'] += 1
+            return
+        self.ephemeral.append(text)
+        self.queued_chars += len(text)
+        self.idle.clear()
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.messages or self.ephemeral:
+                # Сообщения чата всегда идут раньше эфемерных событий
+                if self.messages:
+                    message_id, text = self.messages[0]
+                    await self.send(text_data=text)
+                    self.messages.popleft()
+                    self.queued_chars -= len(text)
+                    self.resume_since = message_id
+                else:
+                    text = self.ephemeral.popleft()
+                    await self.send(text_data=text)
+                    self.queued_chars -= len(text)
+            self.idle.set()
+
+    async def flush(self, timeout):
+        """Дожидается отправки уже поставленных кадров (не дольше timeout секунд)."""
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.close()
+
+    def close(self):
+        self.task.cancel()
+        _queues.discard(self)
+
+    def overflowed(self):
+        _totals['overflow_disconnects'] += 1
+        self.close()
+
+
+def metrics():
+    """Глубина исходящих очередей в этом процессе."""
+    queues = list(_queues)
+    depths = [len(queue) for queue in queues]
+    return {
+        'connections': len(queues),
+        'queued_frames': sum(depths),
+        'max_queue_depth': max(depths, default=0),
+        'queued_chars': sum(queue.queued_chars for queue in queues),
+        **_totals,
+    }
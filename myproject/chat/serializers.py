@@ -0,0 +1,71 @@
+from rest_framework import serializers
+
+from .models import MAX_MESSAGE_LENGTH
+
+
+class LightSerializer(serializers.BaseSerializer):
+    """Сериализатор для списков без ModelSerializer.
+
+    Каждое поле — готовая функция-геттер, поля и их порядок вычисляются один
+    раз на запрос. Поддерживает разреженные наборы полей: ?fields=id,message.
+    """
+
+    getters = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = fields or self.getters.keys()
+        self.selected = [(name, self.getters[name]) for name in names]
+
+    @classmethod
+    def many_init(cls, *args, fields=None, **kwargs):
+        kwargs['child'] = cls(fields=fields)
+        return serializers.ListSerializer(*args, **kwargs)
+
+    @classmethod
+    def parse_fields(cls, request):
+        """Поля из ?fields=...; ValidationError на неизвестные имена."""
+        raw = request.query_params.get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in cls.getters]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Неизвестные поля: {', '.join(unknown)}"})
+        return fields
+
+    def to_representation(self, instance):
+        return {name: getter(instance) for name, getter in self.selected}
+
+
+class RoomListSerializer(LightSerializer):
+    getters = {
+        'id': lambda room: room.id,
+        'name': lambda room: room.name,
+        'description': lambda room: room.description,
+        'is_private': lambda room: room.is_private,
+        'created_by': lambda room: room.created_by_id,
+        'created_at': lambda room: room.created_at.isoformat(),
+    }
+
+
+class MessageListSerializer(LightSerializer):
+    getters = {
+        'id': lambda message: message.id,
+        'room': lambda message: message.room_id,
+        'user_id': lambda message: message.user_id,
+        'username': lambda message: message.user.username,
+        'message': lambda message: message.message,
+        'timestamp': lambda message: message.timestamp.isoformat(),
+        'is_read': lambda message: message.is_read,
+    }
+
+
+class RoomWriteSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    is_private = serializers.BooleanField(required=False, default=False)
+
+
+class MessageWriteSerializer(serializers.Serializer):
+    message = serializers.CharField(max_length=MAX_MESSAGE_LENGTH)
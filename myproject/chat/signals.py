@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import ROOM_LIST_SCOPE, bump_version, room_scope
+from .models import ChatMessage, ChatRoom, RoomMember
+
+
+@receiver([post_save, post_delete], sender=ChatRoom)
+def room_changed(sender, instance, **kwargs):
+    bump_version(ROOM_LIST_SCOPE)
+    bump_version(room_scope(instance.pk))
+
+
+# Сообщения меняют только страницу комнаты: в списке комнат счётчика сообщений нет.
+# Только post_save: receiver post_delete отключил бы быстрое каскадное удаление
+# сообщений вместе с комнатой (по SELECT и incr на каждую строку). Удаление комнаты
+# поднимает версию в room_changed, прямые удаления сообщений — сами
+# (ChatMessageAdmin, jobs.purge_room)
+@receiver(post_save, sender=ChatMessage)
+def message_changed(sender, instance, **kwargs):
+    bump_version(room_scope(instance.room_id))
+
+
+# Участники — и шапку комнаты, и список комнат (приватные комнаты, счётчик участников)
+@receiver([post_save, post_delete], sender=RoomMember)
+def member_changed(sender, instance, **kwargs):
+    bump_version(ROOM_LIST_SCOPE)
+    bump_version(room_scope(instance.room_id))
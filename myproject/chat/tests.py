@@ -1,3 +1,765 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Permission, User
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import caching, drain, ephemeral, history, jobs, outbound
+from .consumers import ChatConsumer
+from .history import RecentBuffer
+from .models import ChatMessage, ChatRoom, RoomMember
+from .outbound import OutboundQueue
+from .routing import websocket_urlpatterns
+from .ws_auth import TicketAuthMiddleware, issue_ticket
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# Страницы админки без collectstatic: у CompressedManifestStaticFilesStorage нет манифеста
+PLAIN_STATIC = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def payload(message_id):
+    return {'id': message_id, 'message': f'm{message_id}'}
+
+
+class RecentBufferTests(SimpleTestCase):
+    def test_eviction_moves_covered_from(self):
+        buffer = RecentBuffer(0, maxlen=3)
+        for message_id in range(1, 6):
+            buffer.add(payload(message_id))
+        self.assertEqual(list(buffer.ids), [3, 4, 5])
+        self.assertEqual(buffer.covered_from, 2)
+        # Сообщение 2 вытеснено — с since=1 буфер ответить не может
+        self.assertIsNone(buffer.since(1))
+        self.assertEqual([p['id'] for p in buffer.since(2)], [3, 4, 5])
+        self.assertEqual(buffer.since(5), [])
+
+    def test_dedup_and_order(self):
+        buffer = RecentBuffer(0, maxlen=5)
+        for message_id in (2, 1, 2, 3, 1):
+            buffer.add(payload(message_id))
+        self.assertEqual(list(buffer.ids), [1, 2, 3])
+        self.assertEqual([p['id'] for p in buffer.payloads], [1, 2, 3])
+
+    def test_ignores_messages_before_covered_from(self):
+        buffer = RecentBuffer(10, maxlen=5)
+        buffer.add(payload(7))
+        buffer.add(payload(11))
+        self.assertEqual(list(buffer.ids), [11])
+
+
+class MissedMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+        cls.ids = [
+            ChatMessage.objects.create(room=cls.room, user=cls.user, message=f'm{i}').id
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        history._recent.clear()
+        self.addCleanup(history._recent.clear)
+
+    def test_from_buffer(self):
+        history.subscribe(self.room.id)
+        # Одна проверка exists() вместо диапазонного запроса
+        with self.assertNumQueries(1):
+            missed, has_gap = history.missed_messages(self.room.id, self.ids[1])
+        self.assertFalse(has_gap)
+        self.assertEqual([p['id'] for p in missed], self.ids[2:])
+
+    def test_db_when_buffer_is_behind(self):
+        history.subscribe(self.room.id)
+        # Сохранено, но ещё не доставлено consumer'у этого процесса
+        late = ChatMessage.objects.create(room=self.room, user=self.user, message='late')
+        missed, has_gap = history.missed_messages(self.room.id, self.ids[-1])
+        self.assertFalse(has_gap)
+        self.assertEqual([p['id'] for p in missed], [late.id])
+
+    def test_db_when_buffer_does_not_cover(self):
+        history._recent[self.room.id] = RecentBuffer(
+            self.ids[2], [payload(message_id) for message_id in self.ids[3:]]
+        )
+        missed, has_gap = history.missed_messages(self.room.id, self.ids[0])
+        self.assertFalse(has_gap)
+        self.assertEqual([p['id'] for p in missed], self.ids[1:])
+        self.assertEqual(missed[0]['username'], 'alice')
+
+    def test_gap(self):
+        with mock.patch.object(history, 'CATCHUP_LIMIT', 3):
+            self.assertEqual(history.missed_messages(self.room.id, 0), ([], True))
+            history.subscribe(self.room.id)
+            self.assertEqual(history.missed_messages(self.room.id, 0), ([], True))
+            missed, has_gap = history.missed_messages(self.room.id, self.ids[1])
+        self.assertFalse(has_gap)
+        self.assertEqual(len(missed), 3)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ChatConsumerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+
+    def setUp(self):
+        history._recent.clear()
+        self.addCleanup(history._recent.clear)
+
+    def communicator(self, query=''):
+        return WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room.id}/{query}'
+        )
+
+    async def send_messages(self, communicator, *texts):
+        received = []
+        for text in texts:
+            await communicator.send_to(text_data=json.dumps({
+                'message': text,
+                'user_id': self.user.id,
+            }))
+            received.append(json.loads(await communicator.receive_from()))
+        return received
+
+    async def test_overflow_closes_with_resume_hint(self):
+        with mock.patch.object(outbound, 'MAX_MESSAGES', 1):
+            communicator = self.communicator()
+            await communicator.connect()
+            # Клиент «не читает»: задача отправки стоит, очередь сокета только растёт
+            for queue in list(outbound._queues):
+                queue.task.cancel()
+            for text in ('one', 'two'):
+                await communicator.send_to(text_data=json.dumps({
+                    'message': text,
+                    'user_id': self.user.id,
+                }))
+            closed = await communicator.receive_output()
+        first = await ChatMessage.objects.filter(room=self.room).order_by('id').afirst()
+        self.assertEqual(closed['type'], 'websocket.close')
+        self.assertEqual(closed['code'], outbound.RESUME_CLOSE_CODE)
+        self.assertEqual(closed['reason'], f'resume:{first.id - 1}')
+
+    async def test_catchup_after_reconnect(self):
+        first = self.communicator()
+        connected, _ = await first.connect()
+        self.assertTrue(connected)
+        received = await self.send_messages(first, 'one', 'two', 'three')
+        await first.disconnect()
+
+        second = self.communicator(f'?since={received[0]["id"]}')
+        connected, _ = await second.connect()
+        self.assertTrue(connected)
+        self.assertEqual(
+            [json.loads(await second.receive_from())['message'] for _ in range(2)],
+            ['two', 'three'],
+        )
+        done = json.loads(await second.receive_from())
+        self.assertEqual((done['type'], done['count']), ('catchup_done', 2))
+        await second.disconnect()
+
+    async def test_no_history_for_invisible_room(self):
+        private = await ChatRoom.objects.acreate(name='private', created_by=self.user, is_private=True)
+        await ChatMessage.objects.acreate(room=private, user=self.user, message='secret')
+        # Сокет без пользователя в scope — аноним
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{private.id}/?since=0'
+        )
+        await communicator.connect()
+        self.assertIn('error', json.loads(await communicator.receive_from()))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_history_gap(self):
+        with mock.patch.object(history, 'CATCHUP_LIMIT', 1):
+            first = self.communicator()
+            await first.connect()
+            await self.send_messages(first, 'one', 'two')
+            await first.disconnect()
+
+            second = self.communicator('?since=0')
+            await second.connect()
+            self.assertEqual(json.loads(await second.receive_from())['type'], 'history_gap')
+            await second.disconnect()
+
+
+class FakeSocket:
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def send(self, text_data):
+        await self.unblocked.wait()
+        self.sent.append(text_data)
+
+
+class OutboundQueueTests(SimpleTestCase):
+    async def test_messages_go_before_ephemeral(self):
+        socket = FakeSocket()
+        queue = OutboundQueue(socket.send)
+        queue.put_ephemeral('typing')
+        queue.put_message(5, 'a')
+        queue.put_message(6, 'b')
+        await queue.flush(1)
+        self.assertEqual(socket.sent, ['a', 'b', 'typing'])
+        self.assertEqual(queue.resume_since, 6)
+
+    async def test_overflow_keeps_resume_hint(self):
+        socket = FakeSocket(blocked=True)
+        with mock.patch.object(outbound, 'MAX_MESSAGES', 2):
+            queue = OutboundQueue(socket.send)
+            self.assertTrue(queue.put_message(10, 'a'))
+            await asyncio.sleep(0)
+            self.assertTrue(queue.put_message(11, 'b'))
+            self.assertFalse(queue.put_message(12, 'c'))
+        # Ни один кадр не ушёл — продолжать с id до первого поставленного
+        self.assertEqual(queue.resume_since, 9)
+        socket.unblocked.set()
+        await queue.flush(1)
+        self.assertEqual(socket.sent, ['a', 'b'])
+        self.assertEqual(queue.resume_since, 11)
+
+    async def test_oversized_frame_into_empty_queue(self):
+        socket = FakeSocket(blocked=True)
+        with mock.patch.object(outbound, 'MAX_CHARS', 10):
+            queue = OutboundQueue(socket.send)
+            self.assertTrue(queue.put_message(1, 'x' * 20))
+            self.assertFalse(queue.put_message(2, 'y'))
+        self.assertEqual(queue.resume_since, 0)
+        queue.close()
+
+    async def test_ephemeral_drops_oldest(self):
+        socket = FakeSocket(blocked=True)
+        dropped = outbound.metrics()['dropped_ephemeral']
+        with mock.patch.object(outbound, 'MAX_EPHEMERAL', 2):
+            queue = OutboundQueue(socket.send)
+        for text in ('e1', 'e2', 'e3'):
+            queue.put_ephemeral(text)
+        self.assertEqual(list(queue.ephemeral), ['e2', 'e3'])
+        self.assertEqual(outbound.metrics()['dropped_ephemeral'], dropped + 1)
+        queue.close()
+
+    async def test_ephemeral_counts_against_max_chars(self):
+        socket = FakeSocket(blocked=True)
+        dropped = outbound.metrics()['dropped_ephemeral']
+        with mock.patch.object(outbound, 'MAX_CHARS', 10):
+            queue = OutboundQueue(socket.send)
+            queue.put_ephemeral('x' * 6)
+            self.assertEqual(queue.queued_chars, 6)
+            # С этим кадром очередь превысила бы MAX_CHARS — он выбрасывается
+            queue.put_ephemeral('y' * 6)
+        self.assertEqual(list(queue.ephemeral), ['x' * 6])
+        self.assertEqual(outbound.metrics()['dropped_ephemeral'], dropped + 1)
+        socket.unblocked.set()
+        await queue.flush(1)
+        self.assertEqual(queue.queued_chars, 0)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_SHARED_CACHE=True)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.other = User.objects.create_user(username='bob')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+        cls.private = ChatRoom.objects.create(name='private', created_by=cls.user, is_private=True)
+        ChatMessage.objects.create(room=cls.room, user=cls.user, message='hello')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_private_room_is_404_even_with_matching_etag(self):
+        for url in (f'/api/rooms/{self.private.id}/', f'/api/rooms/{self.private.id}/messages/'):
+            etag = self.client.get(url)['ETag']
+            # ETag содержит pk пользователя — подставляем тот, что совпал бы у bob
+            guessed = etag.replace(f'-{self.user.pk}"', f'-{self.other.pk}"')
+            other = APIClient()
+            other.force_authenticate(self.other)
+            self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=guessed).status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_not_modified_until_post(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.post(url, {'message': 'new'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['message'], 'new')
+
+    def test_no_etag_without_shared_cache(self):
+        with override_settings(CHAT_SHARED_CACHE=False):
+            response = self.client.get(f'/api/rooms/{self.room.id}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_bulk_limits(self):
+        url = f'/api/rooms/{self.room.id}/messages/bulk/'
+        for data in ([], {'message': 'not a list'}):
+            self.assertEqual(self.client.post(url, data, format='json').status_code, 400)
+        with mock.patch('chat.api.BULK_LIMIT', 2):
+            too_many = [{'message': str(i)} for i in range(3)]
+            self.assertEqual(self.client.post(url, too_many, format='json').status_code, 400)
+            response = self.client.post(url, too_many[:2], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([m['message'] for m in response.data], ['0', '1'])
+        self.assertEqual(ChatMessage.objects.filter(room=self.room).count(), 3)
+
+    def test_unknown_fields(self):
+        response = self.client.get('/api/rooms/?fields=id,bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+    def test_sparse_fields_skip_user_join(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        # Комната и страница сообщений — два запроса в любом случае
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(url, {'fields': 'id,message'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'message'])
+        self.assertNotIn('auth_user', queries.captured_queries[-1]['sql'])
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(url, {'fields': 'id,username'})
+        self.assertEqual(response.data['results'][0]['username'], 'alice')
+        self.assertIn('auth_user', queries.captured_queries[-1]['sql'])
+
+
+class TicketAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+
+    async def scope_user(self, query_string, headers=()):
+        scopes = []
+
+        async def inner(scope, receive, send):
+            scopes.append(scope)
+
+        scope = {
+            'type': 'websocket',
+            'query_string': query_string.encode(),
+            'headers': list(headers),
+        }
+        await TicketAuthMiddleware(inner)(scope, None, None)
+        return scopes[0]['user']
+
+    def test_valid_ticket_without_queries(self):
+        ticket = issue_ticket(self.user)
+        with self.assertNumQueries(0):
+            user = async_to_sync(self.scope_user)(f'ticket={ticket}')
+        self.assertTrue(user.is_authenticated)
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'alice'))
+
+    async def test_bad_tickets_fall_back_to_session(self):
+        ticket = issue_ticket(self.user)
+        forged = ticket[:-2] + ('AA' if not ticket.endswith('AA') else 'BB')
+        wrong_salt = signing.dumps({'id': self.user.pk, 'username': 'alice'}, salt='other')
+        for query in (f'ticket={forged}', f'ticket={wrong_salt}', 'ticket='):
+            user = await self.scope_user(query)
+            self.assertFalse(user.is_authenticated, query)
+        with mock.patch('chat.ws_auth.TICKET_MAX_AGE', -1):
+            self.assertFalse((await self.scope_user(f'ticket={ticket}')).is_authenticated)
+
+    async def test_session_used_when_ticket_is_bad(self):
+        await self.async_client.aforce_login(self.user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.async_client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        user = await self.scope_user('ticket=broken', [(b'cookie', cookie.encode())])
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_identity_ignores_client_fields_when_authenticated(self):
+        consumer = ChatConsumer()
+        consumer.scope = {'user': self.user}
+        spoofed = {'user_id': self.user.pk + 100, 'username': 'mallory'}
+        self.assertEqual(consumer.get_identity(spoofed), (self.user.pk, 'alice'))
+        consumer.scope = {'user': AnonymousUser()}
+        self.assertEqual(consumer.get_identity(spoofed), (self.user.pk + 100, 'mallory'))
+
+
+def fake_render(request, template_name, context=None):
+    # Шаблоны страниц лежат вне приложения (в корне деплоя), проверяем только контекст
+    response = HttpResponse(template_name)
+    response.context_data = context
+    return response
+
+
+@override_settings(CHAT_SHARED_CACHE=True)
+class CachingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.others = [User.objects.create_user(username=f'user{i}') for i in range(3)]
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+        cls.private = ChatRoom.objects.create(name='private', created_by=cls.others[0], is_private=True)
+        for member in [cls.user, *cls.others]:
+            RoomMember.objects.create(room=cls.private, user=member)
+        RoomMember.objects.create(room=cls.room, user=cls.user)
+        for i in range(3):
+            ChatMessage.objects.create(room=cls.private, user=cls.user, message=f'm{i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def expected_counts(self, room):
+        return (
+            RoomMember.objects.filter(room=room).count(),
+            ChatMessage.objects.filter(room=room).count(),
+        )
+
+    def test_room_list_matches_uncached_counts(self):
+        for shared in (True, False):
+            with self.subTest(shared=shared), override_settings(CHAT_SHARED_CACHE=shared):
+                rooms = {room['id']: room for room in caching.room_list(self.user)}
+                self.assertEqual(set(rooms), {self.room.id, self.private.id})
+                for room in (self.room, self.private):
+                    self.assertEqual(rooms[room.id]['participants_count'], self.expected_counts(room)[0])
+
+    def test_room_header_matches_uncached_counts(self):
+        header = caching.room_header(self.private.id)
+        self.assertEqual(
+            (header['participants_count'], header['messages_count']),
+            self.expected_counts(self.private),
+        )
+        self.assertIsNone(caching.room_header(0))
+
+    def test_private_rooms_of_others_are_not_listed(self):
+        outsider = User.objects.create_user(username='outsider')
+        self.assertEqual([room['id'] for room in caching.room_list(outsider)], [self.room.id])
+
+    def versions(self, room_id):
+        return (
+            caching.get_version(caching.ROOM_LIST_SCOPE),
+            caching.get_version(caching.room_scope(room_id)),
+        )
+
+    def assertBumps(self, room, action, room_list, room_page):
+        # room.id берём заранее: после delete() он становится None
+        room_id = room.id
+        before = self.versions(room_id)
+        action()
+        after = self.versions(room_id)
+        self.assertEqual((after[0] != before[0], after[1] != before[1]), (room_list, room_page))
+
+    def test_signal_bumps(self):
+        room = self.room
+        self.assertBumps(room, lambda: room.save(), room_list=True, room_page=True)
+        self.assertBumps(
+            room, lambda: ChatMessage.objects.create(room=room, user=self.user, message='x'),
+            room_list=False, room_page=True,
+        )
+        member = RoomMember(room=room, user=self.others[0])
+        self.assertBumps(room, member.save, room_list=True, room_page=True)
+        self.assertBumps(room, member.delete, room_list=True, room_page=True)
+        self.assertBumps(room, room.delete, room_list=True, room_page=True)
+
+    def test_room_delete_does_not_load_messages(self):
+        # Без post_delete на ChatMessage сообщения удаляются одним DELETE
+        with self.assertNumQueries(4) as queries:
+            self.private.delete()
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT') and 'chat_chatmessage' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+
+@override_settings(CHAT_SHARED_CACHE=True)
+@mock.patch('chat.views.render', fake_render)
+class PageEtagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.other = User.objects.create_user(username='bob')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+        cls.private = ChatRoom.objects.create(name='private', created_by=cls.user, is_private=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_home(self):
+        etag = self.client.get('/')['ETag']
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Сообщение не меняет список комнат
+        ChatMessage.objects.create(room=self.room, user=self.user, message='x')
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        RoomMember.objects.create(room=self.room, user=self.other)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_room_detail(self):
+        url = f'/room/{self.room.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.context_data['messages_count'], 0)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ChatMessage.objects.create(room=self.room, user=self.user, message='x')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['messages_count'], 1)
+
+    def test_private_room_detail(self):
+        url = f'/room/{self.private.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.other)
+        guessed = etag.replace(f'-{self.user.pk}-', f'-{self.other.pk}-')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=guessed).status_code, 404)
+
+    def test_no_etag_without_shared_cache(self):
+        with override_settings(CHAT_SHARED_CACHE=False):
+            for url in ('/', f'/room/{self.room.id}/'):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class DrainTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+
+    def setUp(self):
+        history._recent.clear()
+        self.addCleanup(history._recent.clear)
+        self.addCleanup(drain.stop_draining)
+
+    def communicator(self):
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room.id}/')
+
+    async def assertDrained(self, communicator, window_ms):
+        frame = json.loads(await communicator.receive_from())
+        self.assertEqual(frame['type'], 'reconnect')
+        self.assertLessEqual(frame['delay_ms'], window_ms)
+        closed = await communicator.receive_output()
+        self.assertEqual((closed['type'], closed['code']), ('websocket.close', 1012))
+
+    async def test_drain_process(self):
+        communicators = [self.communicator() for _ in range(2)]
+        for communicator in communicators:
+            self.assertTrue((await communicator.connect())[0])
+        await drain.drain_process(window_ms=50)
+        for communicator in communicators:
+            await self.assertDrained(communicator, 50)
+
+        # Пока идёт drain, новые сокеты не принимаются
+        self.assertTrue(drain.is_draining())
+        connected, _ = await self.communicator().connect()
+        self.assertFalse(connected)
+
+        drain.stop_draining()
+        communicator = self.communicator()
+        self.assertTrue((await communicator.connect())[0])
+        await communicator.disconnect()
+
+    async def test_drain_expires(self):
+        with mock.patch.object(drain, 'DRAIN_HOLD_MS', 0):
+            drain.set_draining(0)
+        await asyncio.sleep(0.01)
+        self.assertFalse(drain.is_draining())
+
+    async def test_command_targets_one_process(self):
+        communicator = self.communicator()
+        await communicator.connect()
+        await sync_to_async(call_command)('drain_chat', pid=os.getpid() + 1, stdout=StringIO())
+        self.assertTrue(await communicator.receive_nothing())
+        self.assertFalse(drain.is_draining())
+        await sync_to_async(call_command)('drain_chat', pid=os.getpid(), window=50, stdout=StringIO())
+        await self.assertDrained(communicator, 50)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class EphemeralTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+
+    def setUp(self):
+        history._recent.clear()
+        self.addCleanup(history._recent.clear)
+
+    async def test_coalesced_per_user_per_tick(self):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add('chat_test', channel)
+        coalescer = ephemeral.Coalescer()
+        with mock.patch.object(ephemeral, 'TICK_MS', 10):
+            coalescer.publish('chat_test', {'event': 'typing', 'user_id': 1, 'data': True})
+            coalescer.publish('chat_test', {'event': 'presence', 'user_id': 2, 'data': 'online'})
+            coalescer.publish('chat_test', {'event': 'typing', 'user_id': 1, 'data': False})
+            batch = await asyncio.wait_for(channel_layer.receive(channel), 1)
+        self.assertEqual(batch['type'], 'ephemeral_batch')
+        # Одна пачка на тик, на пользователя и событие — последнее значение
+        self.assertEqual(
+            sorted((event['user_id'], event['event'], event['data']) for event in batch['events']),
+            [(1, 'typing', False), (2, 'presence', 'online')],
+        )
+        self.assertIsNone(coalescer.task)
+
+    def test_stale_batch(self):
+        self.assertTrue(ephemeral.is_stale({'sent_at': time.time() - 10}))
+        self.assertFalse(ephemeral.is_stale({'sent_at': time.time()}))
+
+    def test_clean_data(self):
+        self.assertIs(ephemeral.clean_data('typing', 'x' * 200000), True)
+        self.assertEqual(ephemeral.clean_data('presence', 'away'), 'away')
+        self.assertIsNone(ephemeral.clean_data('presence', 'x' * (ephemeral.MAX_DATA_LENGTH + 1)))
+        self.assertIsNone(ephemeral.clean_data('presence', {'nested': 'object'}))
+
+    async def test_relayed_to_room(self):
+        sender = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room.id}/')
+        listener = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room.id}/')
+        await sender.connect()
+        await listener.connect()
+        await sender.send_to(text_data=json.dumps({
+            'type': 'typing',
+            'user_id': self.user.id,
+            'username': 'alice',
+            'data': 'x' * 200000,
+        }))
+        frame = json.loads(await listener.receive_from())
+        self.assertEqual(frame['type'], 'ephemeral')
+        self.assertEqual(frame['events'][0]['data'], True)
+
+        # Опоздавшая пачка сокету не отправляется
+        await get_channel_layer().group_send(f'chat_{self.room.id}', {
+            'type': 'ephemeral_batch',
+            'events': [{'event': 'typing', 'user_id': self.user.id, 'data': True}],
+            'sent_at': time.time() - 10,
+        })
+        self.assertTrue(await listener.receive_nothing())
+        await sender.disconnect()
+        await listener.disconnect()
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root', 'root@example.com', 'x')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.admin)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(room=cls.room, user=cls.admin, message=f'm{i}') for i in range(150)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_keyset_paging(self):
+        url = '/admin/chat/chatmessage/'
+        first = self.client.get(url)
+        last_id = list(first.context['cl'].result_list)[-1].id
+        self.assertEqual(first.context['keyset_next'], f'?before={last_id}')
+
+        older = self.client.get(url + first.context['keyset_next'])
+        ids = [message.id for message in older.context['cl'].result_list]
+        self.assertEqual(len(ids), 50)
+        self.assertLess(max(ids), last_id)
+        self.assertIsNone(older.context.get('keyset_next'))
+
+    def test_sorted_list_ignores_before(self):
+        response = self.client.get('/admin/chat/chatmessage/', {'o': '3', 'before': '10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(max(message.id for message in response.context['cl'].result_list), 10)
+        self.assertIsNone(response.context.get('keyset_next'))
+
+    def test_room_actions_need_message_permissions(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        staff.user_permissions.add(*Permission.objects.filter(
+            codename__in=['view_chatroom', 'delete_chatroom'],
+        ))
+
+        def actions():
+            self.client.force_login(User.objects.get(pk=staff.pk))
+            action_form = self.client.get('/admin/chat/chatroom/').context['action_form']
+            return {name for name, _ in action_form.fields['action'].choices} if action_form else set()
+
+        self.assertFalse(actions() & {'purge_room', 'export_room'})
+        staff.user_permissions.add(Permission.objects.get(codename='view_chatmessage'))
+        self.assertEqual(actions() & {'purge_room', 'export_room'}, {'export_room'})
+        staff.user_permissions.add(Permission.objects.get(codename='delete_chatmessage'))
+        self.assertEqual(actions() & {'purge_room', 'export_room'}, {'purge_room', 'export_room'})
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class JobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.room = ChatRoom.objects.create(name='room', created_by=cls.user)
+        cls.other = ChatRoom.objects.create(name='other', created_by=cls.user)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(room=room, user=cls.user, message=f'm{i}')
+            for room in (cls.room, cls.other) for i in range(5)
+        ])
+
+    def setUp(self):
+        self.queue = []
+        patcher = mock.patch.object(jobs, 'enqueue', lambda job_type, **params: self.queue.append(
+            {'type': job_type, **params}
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        chunk = mock.patch.object(jobs, 'CHUNK_SIZE', 2)
+        chunk.start()
+        self.addCleanup(chunk.stop)
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        export = mock.patch.object(jobs, 'EXPORT_DIR', Path(export_dir.name))
+        export.start()
+        self.addCleanup(export.stop)
+
+    def run_jobs(self, event):
+        consumer = jobs.JobConsumer()
+        self.queue.append(event)
+        runs = 0
+        while self.queue:
+            event = self.queue.pop(0)
+            getattr(consumer, event['type'])(event)
+            runs += 1
+        return runs
+
+    def test_purge_in_chunks(self):
+        # 5 сообщений пачками по 2: 2 + 2 + 1
+        self.assertEqual(self.run_jobs({'type': 'purge_room', 'room_id': self.room.id}), 3)
+        self.assertFalse(ChatMessage.objects.filter(room=self.room).exists())
+        self.assertEqual(ChatMessage.objects.filter(room=self.other).count(), 5)
+
+    def test_export_in_chunks(self):
+        started = '20260101000000'
+        path = jobs.EXPORT_DIR / jobs.export_filename(self.room.id, started)
+        event = {'type': 'export_room', 'room_id': self.room.id, 'started': started}
+        self.assertEqual(self.run_jobs(event), 3)
+        self.assertFalse(path.with_name(path.name + '.part').exists())
+        lines = path.read_text(encoding='utf-8').splitlines()
+        self.assertEqual(lines[0], 'id,timestamp,user,message')
+        self.assertEqual([line.rsplit(',', 1)[1] for line in lines[1:]], [f'm{i}' for i in range(5)])
+
+        admin = User.objects.create_superuser('root', 'root@example.com', 'x')
+        self.client.force_login(admin)
+        response = self.client.get(f'/admin/chat/chatroom/exports/{path.name}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), lines)
+        self.assertEqual(self.client.get('/admin/chat/chatroom/exports/room_1_x.csv/').status_code, 404)
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
 from . import views
 
 urlpatterns = [
@@ -8,4 +9,9 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('room/<int:room_id>/', views.room_detail, name='room_detail'),
     path('create-room/', views.create_room, name='create_room'),
+    path('ws-ticket/', views.ws_ticket, name='ws_ticket'),
+    path('metrics/outbound/', views.outbound_metrics, name='outbound_metrics'),
 ]
+
+if settings.ENABLE_REST_API:
+    urlpatterns.append(path('api/', include('chat.api_urls')))
@@ -3,25 +3,33 @@ from django.contrib.auth.models import User
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition
+from .caching import ROOM_LIST_SCOPE, get_version, is_shared, room_header, room_list, room_scope
+from . import outbound
+from .models import ChatMessage, visible_rooms
+from .ws_auth import TICKET_MAX_AGE, issue_ticket
 
+def _page_etag(scope, request):
+    # Без общего кэша версии в этом процессе могут не подниматься — без ETag
+    if not is_shared():
+        return None
+    # Не отдаём 304, пока у пользователя есть непоказанные flash-сообщения
+    if len(messages.get_messages(request)):
+        return None
+    return f'{get_version(scope)}-{request.user.pk or 0}-{settings.CHAT_PAGE_VERSION}'
+
+def home_etag(request):
+    return _page_etag(ROOM_LIST_SCOPE, request)
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=home_etag)
 def home(request):
     if request.user.is_authenticated:
-        rooms = [
-            {
-                'id': 1,
-                'name': 'Общая комната',
-                'description': 'Основная комната для общения',
-                'participants_count': 15,
-                'messages_count': 243
-            },
-            {
-                'id': 2, 
-                'name': 'Игровой чат',
-                'description': 'Обсуждаем игры и киберспорт',
-                'participants_count': 8,
-                'messages_count': 89
-            }
-        ]
+        rooms = room_list(request.user)
         return render(request, 'home.html', {'rooms': rooms})
     else:
         return render(request, 'home.html')
@@ -106,46 +114,50 @@ def logout_view(request):
     messages.info(request, 'Вы вышли из системы.')
     return redirect('home')
 
+def room_detail_etag(request, room_id):
+    return _page_etag(room_scope(room_id), request)
+
 @login_required
+@cache_control(private=True, no_cache=True)
 def room_detail(request, room_id):
-    room = {
-        'id': room_id,
-        'name': 'Общая комната',
-        'participants_count': 15,
-        'messages_count': 243,
-        'links_count': 12,
-        'media_count': 8,
-        'files_count': 5,
-        'music_count': 3,
-        'voice_messages_count': 2
-    }
-    
-    messages_list = [
-        {
-            'user': {'username': 'Администратор', 'is_staff': True},
-            'message': 'Добро пожаловать в чат!',
-            'timestamp': '19:40'
-        },
-        {
-            'user': {'username': request.user.username, 'is_staff': False},
-            'message': 'Привет всем!',
-            'timestamp': '19:41'
-        }
-    ]
-    
+    # Права проверяем до сравнения ETag: чужая приватная комната — 404, а не 304
+    if not visible_rooms(request.user).filter(pk=room_id).exists():
+        raise Http404('Комната не найдена')
+    return _room_page(request, room_id)
+
+@condition(etag_func=room_detail_etag)
+def _room_page(request, room_id):
+    room = room_header(room_id)
+    if room is None:
+        raise Http404('Комната не найдена')
+
+    messages_list = list(
+        ChatMessage.objects.filter(room_id=room_id)
+        .select_related('user')
+        .order_by('-id')[:50]
+    )
+    messages_list.reverse()
+
     context = {
         'room': room,
         'messages': messages_list,
         'participants_count': room['participants_count'],
         'messages_count': room['messages_count'],
-        'links_count': room['links_count'],
-        'media_count': room['media_count'],
-        'files_count': room['files_count'],
-        'music_count': room['music_count'],
-        'voice_messages_count': room['voice_messages_count']
     }
     return render(request, 'room_detail.html', context)
 
+@login_required
+@never_cache
+def ws_ticket(request):
+    # Короткоживущий билет для ws/chat/<id>/?ticket=... — сокет не читает сессию из БД
+    return JsonResponse({'ticket': issue_ticket(request.user), 'expires_in': TICKET_MAX_AGE})
+
+@staff_member_required
+@never_cache
+def outbound_metrics(request):
+    # Исходящие очереди сокетов этого процесса (каждый воркер считает своё)
+    return JsonResponse(outbound.metrics())
+
 @login_required
 def create_room(request):
     if request.method == 'POST':
@@ -0,0 +1,50 @@
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+
+TICKET_SALT = 'chat.ws_ticket'
+TICKET_MAX_AGE = getattr(settings, 'CHAT_WS_TICKET_MAX_AGE', 60)
+
+
+def issue_ticket(user):
+    return signing.dumps({'id': user.pk, 'username': user.username}, salt=TICKET_SALT, compress=True)
+
+
+def read_ticket(ticket):
+    """Пользователь из подписанного билета или None. Без запросов к БД."""
+    try:
+        data = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    # Несохранённый экземпляр: id и username есть, is_authenticated == True
+    return User(pk=data['id'], username=data['username'])
+
+
+class TicketAuthMiddleware:
+    """Аутентификация сокета по ?ticket=<билет из /ws-ticket/>.
+
+    Подпись проверяется без чтения сессии и пользователя из БД, поэтому шторм
+    переподключений не нагружает базу. Без билета (или с просроченным) —
+    обычный AuthMiddlewareStack по cookie сессии.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.fallback = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        ticket = query.get('ticket')
+        user = read_ticket(ticket[0]) if ticket else None
+        if user is None:
+            return await self.fallback(scope, receive, send)
+        return await self.inner(dict(scope, user=user), receive, send)
+
+
+def WebsocketAuthStack(inner):
+    if getattr(settings, 'CHAT_WS_TICKETS', True):
+        return TicketAuthMiddleware(inner)
+    return AuthMiddlewareStack(inner)
@@ -1,16 +1,58 @@
 import os
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import chat.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
+# Сначала настраиваем Django, и только потом импортируем то, что тянет модели
+from django.core.asgi import get_asgi_application
+
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter
+
+from chat import drain
+from chat.ws_auth import WebsocketAuthStack
+
+# Сразу при старте: до первого сокета SIGUSR1 по умолчанию завершил бы процесс
+drain.install_signal_handlers()
+
+
+class LazyApplication:
+    """Собирает ASGI-приложение при первом обращении к нему.
+
+    Воркер поднимается без импорта кода чата (consumers, фоновые задачи),
+    HTTP-запросы его не ждут.
+    """
+
+    def __init__(self, load):
+        self.load = load
+        self.app = None
+
+    async def __call__(self, scope, receive, send):
+        if self.app is None:
+            self.app = self.load()
+        return await self.app(scope, receive, send)
+
+
+def load_websocket_router():
+    from channels.routing import URLRouter
+    import chat.routing
+
+    return URLRouter(chat.routing.websocket_urlpatterns)
+
+
+def load_job_consumer():
+    from chat.jobs import JobConsumer
+
+    return JobConsumer.as_asgi()
+
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            chat.routing.websocket_urlpatterns
-        )
+    "http": django_asgi_app,
+    "websocket": WebsocketAuthStack(
+        LazyApplication(load_websocket_router)
     ),
-})
\ No newline at end of file
+    # manage.py runworker chat-jobs (см. chat/jobs.py)
+    "channel": ChannelNameRouter({
+        "chat-jobs": LazyApplication(load_job_consumer),
+    }),
+})
@@ -11,6 +11,10 @@ SECRET_KEY = 'django-insecure-your-secret-key-here'  # Замените на с
 DEBUG = True
 
 ALLOWED_HOSTS = []
+# Необязательные приложения: воркерам, которые обслуживают только чат, они не нужны
+ENABLE_REST_API = os.environ.get('ENABLE_REST_API', '1') == '1'
+ENABLE_CORS = os.environ.get('ENABLE_CORS', '1') == '1'
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -18,11 +22,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'rest_framework',
+    'channels',  # manage.py runworker для фоновых задач chat-jobs
     'chat',  # только chat
-    'corsheaders',
     'whitenoise.runserver_nostatic',
 ]
+if ENABLE_REST_API:
+    INSTALLED_APPS.append('rest_framework')
+if ENABLE_CORS:
+    INSTALLED_APPS.append('corsheaders')
 ASGI_APPLICATION = 'myproject.asgi.application'
 
 # Настройка channel layers (можно использовать in-memory для разработки)
@@ -61,7 +68,16 @@ DATABASES = {
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Хэшированные имена + заранее сжатые .gz/.br (brotli, если установлен пакет Brotli).
+# WhiteNoise отдаёт хэшированные файлы с Cache-Control на год.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # CORS настройки
 CORS_ALLOW_ALL_ORIGINS = True
@@ -74,18 +90,19 @@ if not DEBUG:
     CSRF_COOKIE_SECURE = True
 
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',  # 👈 добавили
     'django.middleware.security.SecurityMiddleware',
+    # WhiteNoise — сразу после SecurityMiddleware, чтобы статика не проходила остальную цепочку
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
+if ENABLE_CORS:
+    # CorsMiddleware должен стоять как можно выше
+    MIDDLEWARE.insert(0, 'corsheaders.middleware.CorsMiddleware')
 
 # Настройки CORS
 CORS_ALLOW_ALL_ORIGINS = True
@@ -103,6 +120,67 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Догрузка пропущенных сообщений при переподключении (ws/chat/<id>/?since=<message_id>)
+CHAT_RECENT_BUFFER_SIZE = 200  # последних сообщений комнаты в памяти процесса
+CHAT_CATCHUP_LIMIT = 500  # больше — клиент получает history_gap и листает историю
+
+# Drain перед деплоем одного процесса: kill -USR1 <pid> или manage.py drain_chat --pid <pid>
+# (с другого хоста — ещё --host). Отмена без перезапуска: kill -USR2 <pid>
+CHAT_DRAIN_WINDOW_MS = 10000  # окно, по которому разбрасываются переподключения
+CHAT_DRAIN_HOLD_MS = 60000  # после окна drain снимается сам, если процесс не перезапустили
+CHAT_DRAIN_SIGNAL = 'SIGUSR1'
+CHAT_UNDRAIN_SIGNAL = 'SIGUSR2'
+CHAT_DRAIN_FLUSH_TIMEOUT_MS = 2000  # сколько ждать отправки уже поставленных кадров
+
+# Эфемерные события (typing, presence): склеиваются за тик, опоздавшие отбрасываются
+CHAT_EPHEMERAL_TICK_MS = 100
+CHAT_EPHEMERAL_MAX_LAG_MS = 1000
+CHAT_EPHEMERAL_MAX_DATA_LENGTH = 32  # typing — флаг, presence — короткая строка статуса
+
+# REST API (chat/api.py): максимум сообщений в одном запросе .../messages/bulk/
+CHAT_API_BULK_LIMIT = 100
+
+# Фоновые задачи админки (очистка и экспорт комнат): manage.py runworker chat-jobs
+CHAT_JOBS_CHUNK_SIZE = 1000
+# Файлы экспорта скачиваются из админки (/admin/chat/chatroom/exports/<имя>/), поэтому
+# каталог должен быть общим для runworker и веб-процессов (один хост или общий том)
+CHAT_EXPORT_DIR = BASE_DIR / 'exports'
+
+# Аутентификация WebSocket: подписанный билет из /ws-ticket/ (?ticket=...) проверяется
+# без БД; без билета — сессия, как раньше
+CHAT_WS_TICKETS = os.environ.get('CHAT_WS_TICKETS', '1') == '1'
+CHAT_WS_TICKET_MAX_AGE = 60  # секунд
+
+# cached_db: сессия читается из кэша, в БД — только запись и промах.
+# С несколькими воркерами нужен общий кэш (REDIS_URL), иначе выход из системы
+# на одном воркере не будет виден остальным до истечения сессии
+if os.environ.get('CHAT_SESSION_CACHE') == '1':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Исходящая очередь каждого сокета (chat/outbound.py). Переполнение сообщениями —
+# закрытие с кодом 4008 и reason 'resume:<id>'; эфемерные события — вытеснение старых
+CHAT_OUTBOUND_MAX_MESSAGES = 100
+CHAT_OUTBOUND_MAX_CHARS = 1024 * 1024
+CHAT_OUTBOUND_MAX_EPHEMERAL = 10
+CHAT_MAX_MESSAGE_LENGTH = 4000  # и для WebSocket, и для REST API
+
+# Кэш страниц: версии ключей (chat/caching.py) должны быть общими для всех воркеров,
+# поэтому в продакшене нужен Redis. Без REDIS_URL кэш локальный для процесса, и тогда
+# страницы и API отдаются без ETag и без кэша данных (CHAT_SHARED_CACHE = False)
+CHAT_SHARED_CACHE = bool(os.environ.get('REDIS_URL'))
+if CHAT_SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+
+CHAT_PAGE_CACHE_TTL = 60 * 60  # секунд; версии ключей бессрочные, данные — нет
+
+# Входит в ETag страниц: после деплоя (новые шаблоны) клиенты не получат устаревший 304
+CHAT_PAGE_VERSION = os.environ.get('RAILWAY_GIT_COMMIT_SHA', '1')
+
 ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
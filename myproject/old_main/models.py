@@ -1,84 +0,0 @@
-from django.db import models
-from django.contrib.auth.models import User
-from django.utils import timezone
-
-# Модель пользователя (расширяем стандартную модель User)
-class UserProfile(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
-    bio = models.TextField(max_length=500, blank=True)
-    birth_date = models.DateField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    
-    def __str__(self):
-        return self.user.username
-
-# Модель чат-комнаты
-class ChatRoom(models.Model):
-    name = models.CharField(max_length=100, unique=True)
-    description = models.TextField(blank=True)
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_rooms')
-    created_at = models.DateTimeField(auto_now_add=True)
-    is_private = models.BooleanField(default=False)
-    
-    class Meta:
-        ordering = ['-created_at']
-    
-    def __str__(self):
-        return self.name
-
-# Модель сообщения в чате
-class ChatMessage(models.Model):
-    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages')
-    message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
-    
-    class Meta:
-        ordering = ['timestamp']
-    
-    def __str__(self):
-        return f"{self.user.username}: {self.message[:30]}"
-
-# Модель для учета участников комнаты (для приватных чатов)
-class RoomMember(models.Model):
-    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='members')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_memberships')
-    joined_at = models.DateTimeField(auto_now_add=True)
-    is_admin = models.BooleanField(default=False)
-    
-    class Meta:
-        unique_together = ['room', 'user']
-    
-    def __str__(self):
-        return f"{self.user.username} in {self.room.name}"
-
-# Модель для блога (если захотите добавить)
-class BlogPost(models.Model):
-    title = models.CharField(max_length=200)
-    content = models.TextField()
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    is_published = models.BooleanField(default=False)
-    
-    class Meta:
-        ordering = ['-created_at']
-    
-    def __str__(self):
-        return self.title
-
-# Модель комментариев к постам блога
-class Comment(models.Model):
-    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
-    content = models.TextField(max_length=1000)
-    created_at = models.DateTimeField(auto_now_add=True)
-    is_approved = models.BooleanField(default=True)
-    
-    class Meta:
-        ordering = ['created_at']
-    
-    def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.title}"
\ No newline at end of file